@@ -1,68 +1,222 @@
 from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from pathlib import Path
+import json
+import os
+import re
+import socket
+import threading
+import time
 from typing import Any, Dict, List
 from datetime import datetime
 import yaml
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
 
 from src.markets import fetch_watchlist
 from src.calendar_util import get_free_blocks
 from src.news import fetch_news
-from src.render import render_brief
-from src.llm import summarize_news
-from src.emailer import send_brief
+# src.render / src.llm / src.emailer se importan en la sección que los usa
+
+_WS = re.compile(r"\s+")
+
+# (mtime_ns, size, parsed) por ruta; LRU pequeño para ejecuciones repetidas en el mismo proceso
+_YAML_CACHE: "OrderedDict[str, tuple[int, int, Dict[str, Any]]]" = OrderedDict()
+_YAML_CACHE_MAX = 16
+
+def _load_yaml_cached(p: Path) -> Dict[str, Any]:
+    st = p.stat()
+    key = str(p.resolve())
+    hit = _YAML_CACHE.get(key)
+    if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        _YAML_CACHE.move_to_end(key)
+        return deepcopy(hit[2])
+    data = yaml.load(p.read_bytes(), Loader=_SafeLoader) or {}
+    _YAML_CACHE[key] = (st.st_mtime_ns, st.st_size, data)
+    _YAML_CACHE.move_to_end(key)
+    while len(_YAML_CACHE) > _YAML_CACHE_MAX:
+        _YAML_CACHE.popitem(last=False)
+    return deepcopy(data)
+
+# Config ya fusionada en JSON; el YAML sigue siendo la fuente de verdad.
+# Incluye lo de config.local.yaml (p.ej. email.smtp.password): se escribe solo legible por el dueño.
+_CONFIG_JSON_CACHE = Path(".cache/config.json")
+
+def _config_fingerprint(base: Path, local: Path) -> str:
+    st = base.stat()
+    loc = f"{local.stat().st_mtime_ns}-{local.stat().st_size}" if local.exists() else "0"
+    return f"{base.resolve()}:{st.st_mtime_ns}-{st.st_size}-{loc}"
 
 def load_config(path: str) -> Dict[str, Any]:
     base = Path(path)
     if not base.exists():
         raise FileNotFoundError(f"No se encontró el archivo de configuración: {path}")
-    with base.open("r", encoding="utf-8") as f:
-        cfg = yaml.safe_load(f) or {}
     local = Path("config.local.yaml")
+    fp = _config_fingerprint(base, local)
+    try:
+        with _CONFIG_JSON_CACHE.open("r", encoding="utf-8") as f:
+            j = json.load(f)
+        if j.get("_fp") == fp and isinstance(j.get("cfg"), dict):
+            return j["cfg"]
+    except Exception:
+        pass
+
+    cfg = _load_yaml_cached(base)
     if local.exists():
-        with local.open("r", encoding="utf-8") as f:
-            loc = yaml.safe_load(f) or {}
+        loc = _load_yaml_cached(local)
         for k, v in loc.items():
-            if isinstance(v, dict) and isinstance(cfg.get(k), dict):
-                cfg[k].update(v)
+            cur = cfg.get(k)
+            if isinstance(v, dict) and isinstance(cur, dict):
+                cur.update(v)
             else:
                 cfg[k] = v
+    tmp = _CONFIG_JSON_CACHE.with_name(_CONFIG_JSON_CACHE.name + ".tmp")
+    try:
+        _CONFIG_JSON_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp.unlink(missing_ok=True)  # O_CREAT solo aplica el modo a archivos nuevos
+        # 0600 sin depender del umask; os.replace deja también el archivo final con ese modo
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"_fp": fp, "cfg": cfg}, f, ensure_ascii=False)
+        os.replace(tmp, _CONFIG_JSON_CACHE)
+    except (TypeError, ValueError):
+        # valores no serializables en JSON (p.ej. fechas YAML): no cacheamos
+        tmp.unlink(missing_ok=True)
+        _CONFIG_JSON_CACHE.unlink(missing_ok=True)
+    except OSError:
+        pass
     return cfg
 
 def fmt_hm(dt: datetime) -> str:
-    return dt.strftime("%H:%M")
+    return f"{dt.hour:02d}:{dt.minute:02d}"
+
+def fmt_ymd_hm(dt: datetime) -> str:
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}"
+
+_DOCS_PREFIX = "docs/"
+
+def _build_template_fragments(df: Any, blocks: List[Dict[str, Any]], suggestions: List[Dict[str, Any]],
+                              articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    markets_list: List[Dict[str, Any]] = []
+    if df is not None and not df.empty:
+        # rutas de chart relativas a docs/ (Pages) en una sola pasada vectorizada
+        chart_url = df["chart"].fillna("").astype(str).str.replace("\\", "/", regex=False).str.removeprefix(_DOCS_PREFIX)
+        markets_list = df[["ticker", "price", "pct_d", "signal"]].assign(chart_url=chart_url).to_dict(orient="records")
+
+    blocks_tpl = [{"start_hm": fmt_hm(b["start"]), "end_hm": fmt_hm(b["end"]), "minutes": b["minutes"]} for b in blocks]
+    sugg_tpl = [{"type": s["type"], "start_hm": fmt_hm(s["start"]), "end_hm": fmt_hm(s["end"]), "minutes": s["minutes"]} for s in suggestions]
+    news_tpl = [{"title": a["title"], "url": a["url"], "source": a["source"], "published_hm": fmt_ymd_hm(a["published"]), "snippet": _WS.sub(" ", a.get("snippet", "")).strip()[:220]} for a in articles]
+    return {"markets": markets_list, "blocks": blocks_tpl, "suggestions": sugg_tpl, "news": news_tpl}
 
-def _rel_from_docs(p: str | Path) -> str:
-    if not p: return ""
-    q = Path(p)
+def _sync_ics_if_stale(urls: str | List[str], ics_path: str, ttl_minutes: int) -> None:
+    """Descarga el ICS sólo si no existe o si la copia local tiene más de `ttl_minutes`."""
+    if not urls:
+        return
+    try:
+        if time.time() - Path(ics_path).stat().st_mtime < ttl_minutes * 60:
+            return
+    except OSError:
+        pass
+    from src.ics_sync import sync_ics
     try:
-        return str(q.relative_to(Path("docs"))).replace("\\", "/")
-    except ValueError:
-        return str(q).replace("\\", "/")
+        sync_ics(urls, ics_path)
+    except Exception as e:
+        print(f"[WARN] No se pudo sincronizar el calendario: {e}")
+
+def _load_agenda(ics_url: str | List[str], ttl_minutes: int, **kwargs: Any) -> tuple[List[Dict], List[Dict]]:
+    _sync_ics_if_stale(ics_url, kwargs["ics_path"], ttl_minutes)
+    return get_free_blocks(**kwargs)
+
+def _prewarm_dns(hosts: List[str]) -> None:
+    """Resuelve DNS en segundo plano para que el primer request no pague ese RTT."""
+    def _resolve() -> None:
+        for h in hosts:
+            try:
+                socket.getaddrinfo(h, 443)
+            except OSError:
+                pass
+    if hosts:
+        threading.Thread(target=_resolve, daemon=True).start()
+
+def _warmup_llm(ai_cfg: Dict[str, Any]) -> None:
+    """Carga el modelo de Ollama en segundo plano mientras corren los fetches de I/O."""
+    def _warm() -> None:
+        from src.llm import warmup_ollama
+        warmup_ollama(str(ai_cfg.get("model", "qwen2.5:3b-instruct")))
+    threading.Thread(target=_warm, daemon=True).start()
 
 def main() -> None:
     cfg = load_config("config.yaml")
 
-    # Markets
-    tickers: List[str] = list(cfg.get("watchlist", [])) if isinstance(cfg.get("watchlist", []), list) else []
-    charts_dir: str = str(cfg.get("paths", {}).get("charts_dir", "docs/charts"))
-    df = fetch_watchlist(tickers, charts_dir)
+    # Config destructure: cada sub-árbol se lee una sola vez
+    watchlist = cfg.get("watchlist", [])
+    paths: Dict[str, Any] = cfg.get("paths", {}) or {}
+    sb: Dict[str, Any] = cfg.get("study_blocks", {}) or {}
+    news_cfg: Dict[str, Any] = cfg.get("news", {}) or {}
+    ai_cfg: Dict[str, Any] = cfg.get("ai", {}) or {}
+    pub_cfg: Dict[str, Any] = cfg.get("publish", {}) or {}
+    email_cfg: Dict[str, Any] = cfg.get("email", {}) or {}
+
+    tickers: List[str] = list(watchlist) if isinstance(watchlist, list) else []
+    charts_dir: str = str(paths.get("charts_dir", "docs/charts"))
+
+    ics_path: str = str(paths.get("calendar_ics", "data/calendar.ics"))
+    ics_url: str | List[str] = paths.get("calendar_url") or ""
+    ics_ttl: int = int(paths.get("calendar_ttl_minutes", 15))
+    ics_fast: bool = bool(paths.get("calendar_fast_parse", True))
+    min_block: int = int(sb.get("min_block_minutes", 60))
+    deep_block: int = int(sb.get("deep_block_minutes", 90))
+
+    kws: List[str] = list(news_cfg.get("keywords", ["AI", "Machine Learning", "Fintech SaaS"]))
+    limit: int = int(news_cfg.get("limit", 6))
+    max_age: int = int(news_cfg.get("max_age_hours", 36))
+    lang: str = str(news_cfg.get("lang", "en-US"))
+    region: str = str(news_cfg.get("region", "US"))
+
+    _prewarm_dns(
+        (["query1.finance.yahoo.com", "query2.finance.yahoo.com"] if tickers else [])
+        + (["news.google.com"] if kws else [])
+    )
+    # solo hay resumen LLM si hay noticias que pedir
+    if ai_cfg.get("enabled", True) and ai_cfg.get("warmup", True) and kws and max_age > 0:
+        _warmup_llm(ai_cfg)
+
+    # Markets, agenda y news son independientes (I/O): corren en paralelo
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_mkt = ex.submit(fetch_watchlist, tickers, charts_dir)
+        # el sync del ICS (si toca) va dentro del mismo job: get_free_blocks depende de él
+        f_cal = ex.submit(
+            _load_agenda, ics_url, ics_ttl,
+            ics_path=ics_path, min_block=min_block, deep_block=deep_block,
+            day_start_hour=8, day_end_hour=21, fast_parse=ics_fast,
+        )
+        # sin keywords o sin ventana de tiempo no hay nada que pedir
+        f_news = (
+            ex.submit(fetch_news, kws, limit=limit, max_age_hours=max_age, lang=lang, region=region)
+            if kws and max_age > 0 else None
+        )
+        df = f_mkt.result()
+        blocks, suggestions = f_cal.result()
+        articles: List[Dict[str, Any]] = f_news.result() if f_news is not None else []
+    blocks, suggestions, articles = blocks or [], suggestions or [], articles or []
+
+    # Markets (columnas en el orden de fetch_watchlist: ticker | price | pct_d | signal | chart)
+    has_mkt = df is not None and not df.empty
+    if has_mkt:
+        df = df.fillna({"price": 0.0, "pct_d": 0.0}).astype({"price": "float64", "pct_d": "float64"})
 
     print("\n=== 📈 Markets (resumen) ===")
-    if df is not None and not df.empty:
-        for r in df.to_dict(orient="records"):
-            print(f"{r.get('ticker','')}: ${r.get('price','')}  ({r.get('pct_d','')}% d/d)  – {r.get('signal','')}  | chart: {r.get('chart','')}")
+    if has_mkt:
+        for ticker, price, pct_d, signal, chart in df.itertuples(index=False, name=None):
+            print(f"{ticker}: ${price}  ({pct_d}% d/d)  – {signal}  | chart: {chart}")
     else:
         print("⚠️ Sin info de mercados")
 
     # Agenda
-    ics_path: str = str(cfg.get("paths", {}).get("calendar_ics", "data/calendar.ics"))
-    min_block: int = int(cfg.get("study_blocks", {}).get("min_block_minutes", 60))
-    deep_block: int = int(cfg.get("study_blocks", {}).get("deep_block_minutes", 90))
-    blocks, suggestions = get_free_blocks(
-        ics_path=ics_path, min_block=min_block, deep_block=deep_block,
-        day_start_hour=8, day_end_hour=21,
-    )
-
     print("\n=== 🗓️ Agenda (hoy) — Huecos detectados ===")
     if blocks:
         for b in blocks:
@@ -78,21 +232,12 @@ def main() -> None:
         print("Sin sugerencias")
 
     # News
-    news_cfg: Dict[str, Any] = cfg.get("news", {}) or {}
-    kws: List[str] = list(news_cfg.get("keywords", ["AI", "Machine Learning", "Fintech SaaS"]))
-    limit: int = int(news_cfg.get("limit", 6))
-    max_age: int = int(news_cfg.get("max_age_hours", 36))
-    lang: str = str(news_cfg.get("lang", "en-US"))
-    region: str = str(news_cfg.get("region", "US"))
-
-    articles = fetch_news(kws, limit=limit, max_age_hours=max_age, lang=lang, region=region)
-
     print(f"\n=== 📰 AI/ML & Fintech News (≤ {max_age}h) ===")
     if not articles:
         print("Sin noticias recientes con esos filtros.")
     else:
         for a in articles:
-            when = a["published"].strftime("%Y-%m-%d %H:%M")
+            when = fmt_ymd_hm(a["published"])
             print(f"• [{a['source']}] {a['title']}  ({when})")
             print(f"  {a['url']}")
             if a.get("snippet"):
@@ -100,44 +245,32 @@ def main() -> None:
             else:
                 print()
 
-    # AI summary (fast, non-blocking-style)
-    ai_cfg: Dict[str, Any] = cfg.get("ai", {}) or {}
+    # AI summary (fast, non-blocking-style); template fragments are built meanwhile
     editorial: Dict[str, Any] = {"summary": "", "macro": "", "picks": []}
-    if ai_cfg.get("enabled", True) and articles:
-        editorial = summarize_news(articles, ai_cfg)
-        print("\n=== 🧠 AI Editorial Summary ===")
-        if editorial.get("summary"): print(editorial["summary"])
-        if editorial.get("macro"):
-            print("\nMacro:"); print(editorial["macro"])
-        if editorial.get("picks"):
-            print("\nResearch picks:")
-            for p in editorial["picks"]:
-                print(f"- {p.get('title','')} — {p.get('why','')}")
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        f_frags = ex.submit(_build_template_fragments, df, blocks, suggestions, articles)
+        if ai_cfg.get("enabled", True) and articles:
+            from src.llm import summarize_news
+            editorial = summarize_news(articles, ai_cfg)
+            print("\n=== 🧠 AI Editorial Summary ===")
+            if editorial.get("summary"): print(editorial["summary"])
+            if editorial.get("macro"):
+                print("\nMacro:"); print(editorial["macro"])
+            if editorial.get("picks"):
+                print("\nResearch picks:")
+                for p in editorial["picks"]:
+                    print(f"- {p.get('title','')} — {p.get('why','')}")
+        frags = f_frags.result()
 
     # Render HTML (for email + Pages)
+    from src.render import render_brief
     out_html = Path("docs/index.html")
     out_html.parent.mkdir(parents=True, exist_ok=True)
 
-    markets_list: List[Dict[str, Any]] = []
-    if df is not None and not df.empty:
-        for r in df.to_dict(orient="records"):
-            chart_url = _rel_from_docs(r.get("chart", "")) if r.get("chart") else ""
-            markets_list.append({
-                "ticker": r.get("ticker", ""),
-                "price": float(r.get("price", 0.0)),
-                "pct_d": float(r.get("pct_d", 0.0)),
-                "signal": r.get("signal", ""),
-                "chart_url": chart_url,
-            })
-
-    blocks_tpl = [{"start_hm": b["start"].strftime("%H:%M"), "end_hm": b["end"].strftime("%H:%M"), "minutes": b["minutes"]} for b in blocks]
-    sugg_tpl = [{"type": s["type"], "start_hm": s["start"].strftime("%H:%M"), "end_hm": s["end"].strftime("%H:%M"), "minutes": s["minutes"]} for s in suggestions]
-    news_tpl = [{"title": a["title"], "url": a["url"], "source": a["source"], "published_hm": a["published"].strftime("%Y-%m-%d %H:%M"), "snippet": " ".join(a.get("snippet", "").split())[:220]} for a in (articles or [])]
-
     template_path = "templates/brief.html"
     context = {
-        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        "markets": markets_list, "blocks": blocks_tpl, "suggestions": sugg_tpl, "news": news_tpl,
+        "generated_at": fmt_ymd_hm(datetime.now()),
+        **frags,
         "editorial_summary": editorial.get("summary", ""), "editorial_macro": editorial.get("macro", ""),
         "editorial_picks": editorial.get("picks", []), "min_block": min_block, "max_age": max_age,
     }
@@ -145,10 +278,11 @@ def main() -> None:
     print(f"\n🖨️  HTML generado: {out_file}")
 
     # Email with embedded charts; include Pages link
-    pages_url = (cfg.get("publish", {}) or {}).get("site_url", "").strip()
-    if (cfg.get("email", {}) or {}).get("enabled", False):
+    pages_url = str(pub_cfg.get("site_url", "") or "").strip()
+    if email_cfg.get("enabled", False):
+        from src.emailer import send_all
         try:
-            send_brief(cfg, out_file, pages_url=pages_url)
+            send_all(cfg, out_file, pages_url=pages_url)
             print("✉️  Email enviado.")
         except Exception as e:
             print(f"[WARN] No se pudo enviar el email: {e}")
@@ -0,0 +1,42 @@
+# src/_chart_render.py
+from __future__ import annotations
+
+import os
+import threading
+
+import numpy as np
+# Figure + canvas Agg explícitos (sin pyplot): sin estado global, seguro entre threads.
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+_DPI = 80  # se ven embebidos en el HTML/email: no hace falta resolución de impresión
+# un Figure + Axes por thread worker, reutilizado entre tickers (ax.clear() entre uno y otro)
+_FIGS = threading.local()
+
+
+def _thread_figure() -> tuple[Figure, Axes]:
+    fa = getattr(_FIGS, "fa", None)
+    if fa is None:
+        fig = Figure(figsize=(6, 3), dpi=_DPI)
+        FigureCanvasAgg(fig)
+        # márgenes fijos una sola vez: sin tight_layout (otra pasada de layout) por ticker
+        fig.subplots_adjust(left=0.13, right=0.96, top=0.9, bottom=0.12)
+        fa = _FIGS.fa = (fig, fig.add_subplot(111))
+    return fa
+
+
+def render_chart(t: str, x: np.ndarray, close: np.ndarray, ma20: np.ndarray, ma50: np.ndarray, out_path: str) -> None:
+    """Dibuja Close/MA20/MA50 y escribe el PNG de forma atómica."""
+    fig, ax = _thread_figure()
+    ax.clear()
+    ax.plot(x, close, label="Close")
+    ax.plot(x, ma20, label="MA20")
+    ax.plot(x, ma50, label="MA50")
+    ax.legend()
+    ax.set_title(t)
+    ax.set_xlabel("")
+    ax.set_ylabel("Precio")
+    tmp_path = out_path + ".tmp"
+    fig.savefig(tmp_path, format="png", dpi=_DPI)
+    os.replace(tmp_path, out_path)
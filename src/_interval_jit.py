@@ -0,0 +1,48 @@
+# src/_interval_jit.py
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+
+
+def _merge_sorted(starts: np.ndarray, ends: np.ndarray, out_s: np.ndarray, out_e: np.ndarray) -> int:
+    """
+    Fusiona intervalos int64 ya ordenados por inicio en los buffers de salida.
+    Devuelve cuántos intervalos fusionados se escribieron.
+    """
+    n = starts.shape[0]
+    if n == 0:
+        return 0
+    k = 0
+    cs = starts[0]
+    ce = ends[0]
+    for i in range(1, n):
+        s = starts[i]
+        e = ends[i]
+        if s <= ce:
+            if e > ce:
+                ce = e
+        else:
+            out_s[k] = cs
+            out_e[k] = ce
+            k += 1
+            cs = s
+            ce = e
+    out_s[k] = cs
+    out_e[k] = ce
+    return k + 1
+
+
+@lru_cache(maxsize=1)
+def merge_kernel() -> Any:
+    """
+    Kernel compilado con numba, o None si no está instalado. Import y compilación son perezosos
+    (~0.4 s en frío, sin caché en CI): solo se pagan cuando calendar_util lo pide para días grandes.
+    """
+    try:
+        from numba import njit  # type: ignore
+    except ImportError:  # numba es opcional: sin él, calendar_util usa la ruta NumPy
+        return None
+    return njit(cache=True)(_merge_sorted)
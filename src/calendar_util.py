@@ -1,17 +1,38 @@
 from __future__ import annotations
 
-from datetime import date, datetime, time, timedelta
+import os
+import re
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple, cast
+from typing import Any, Dict, List, Tuple, cast
 
+import numpy as np
 from icalendar import Calendar as _Calendar
-from zoneinfo import ZoneInfo
+from icalendar.prop import vDuration as _vDuration
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from src import _interval_jit
+
+_tz = lru_cache(maxsize=8)(ZoneInfo)
+
+try:
+    import recurring_ical_events as _RIE  # type: ignore
+except Exception:  # opcional: sin él sólo vemos la primera ocurrencia de cada VEVENT
+    _RIE = None
+
+
+@lru_cache(maxsize=8)
+def _parse_cached(path_str: str, mtime_ns: int, size: int) -> _Calendar:
+    # mtime_ns/size forman parte de la clave: si el archivo cambia, se vuelve a parsear
+    return cast(_Calendar, _Calendar.from_ical(Path(path_str).read_bytes()))
 
 
 def _load_calendar(ics_path: str | Path) -> _Calendar:
-    p = Path(ics_path)
-    text = p.read_text(encoding="utf-8", errors="ignore")
-    return cast(_Calendar, _Calendar.from_ical(text))
+    p = Path(ics_path).resolve()
+    st = os.stat(p)
+    return _parse_cached(str(p), st.st_mtime_ns, st.st_size)
 
 
 def _to_local_dt(val: datetime | date, tz: ZoneInfo, is_end: bool = False) -> datetime:
@@ -24,38 +45,199 @@ def _to_local_dt(val: datetime | date, tz: ZoneInfo, is_end: bool = False) -> da
     return datetime(val.year, val.month, val.day, 0, 0, tzinfo=tz)
 
 
-def _clip_interval(
-    start: datetime, end: datetime, win_start: datetime, win_end: datetime
-) -> Tuple[datetime, datetime] | None:
+def _clip_interval(start: int, end: int, win_start: int, win_end: int) -> Tuple[int, int] | None:
     s = max(start, win_start)
     e = min(end, win_end)
     return (s, e) if s < e else None
 
 
-def _merge_intervals(intervals: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
-    if not intervals:
-        return []
-    intervals.sort(key=lambda x: x[0])
-    merged: List[Tuple[datetime, datetime]] = [intervals[0]]
-    for s, e in intervals[1:]:
-        ls, le = merged[-1]
-        if s <= le:
-            merged[-1] = (ls, max(le, e))
-        else:
-            merged.append((s, e))
-    return merged
+def _wall_ep(dt: datetime) -> int:
+    # segundos "de reloj" (fecha/hora local sin offset): misma aritmética que datetimes con el mismo tzinfo
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _from_wall_ep(ep: int) -> datetime:
+    return datetime.fromtimestamp(int(ep), timezone.utc).replace(tzinfo=None)
+
+
+_SWEEP_MIN = 32
+
+
+def _merge_sweep(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sweep-line: +1 en cada inicio, -1 en cada fin; los cruces de profundidad 0 delimitan lo ocupado."""
+    t = np.concatenate((starts, ends))
+    d = np.concatenate((np.ones_like(starts), -np.ones_like(ends)))
+    # a igual tiempo, inicios antes que fines: intervalos contiguos se fusionan (como s <= le)
+    order = np.lexsort((-d, t))
+    t, d = t[order], d[order]
+    depth = np.cumsum(d)
+    prev = np.concatenate(([0], depth[:-1]))
+    return t[(prev == 0) & (depth > 0)], t[depth == 0]
+
+
+def _merge_intervals(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Fusiona intervalos [start, end) solapados o contiguos; devuelve arrays int64 ordenados."""
+    if starts.size == 0:
+        return starts, ends
+    if starts.size > _SWEEP_MIN:
+        # solo días grandes justifican importar/compilar numba; un día típico usa NumPy
+        kernel = _interval_jit.merge_kernel()
+        if kernel is None:
+            return _merge_sweep(starts, ends)
+        order = np.argsort(starts, kind="stable")
+        s, e = starts[order], ends[order]
+        ms = np.empty_like(s)
+        me = np.empty_like(e)
+        n = kernel(s, e, ms, me)
+        return ms[:n], me[:n]
+    order = np.argsort(starts, kind="stable")
+    s, e = starts[order], ends[order]
+    run_end = np.maximum.accumulate(e)
+    brk = s[1:] > run_end[:-1]
+    ms = np.concatenate((s[:1], s[1:][brk]))
+    me = np.concatenate((run_end[:-1][brk], run_end[-1:]))
+    return ms, me
+
+
+# id(cal) -> (cal, índice de recurrencias). Guardamos el Calendar para que su id no se recicle.
+_RULERS: "OrderedDict[int, Tuple[_Calendar, Any]]" = OrderedDict()
+_RULERS_MAX = 4
+
+
+def _ruler(cal: _Calendar) -> Any:
+    hit = _RULERS.get(id(cal))
+    if hit is not None and hit[0] is cal:
+        _RULERS.move_to_end(id(cal))
+        return hit[1]
+    ruler = _RIE.of(cal)
+    _RULERS[id(cal)] = (cal, ruler)
+    while len(_RULERS) > _RULERS_MAX:
+        _RULERS.popitem(last=False)
+    return ruler
+
+
+# Propiedades que requieren el parser completo (recurrencias / overrides)
+_RECUR_PROPS = frozenset({"RRULE", "RDATE", "EXDATE", "EXRULE", "RECURRENCE-ID"})
+_DT_RE = re.compile(r"(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})(Z)?)?")
+
+# (start, end) tal como vienen del ICS: date, datetime naive o datetime con tz
+_Event = Tuple[Any, Any]
+
+def _split_prop(line: str) -> Tuple[str, Dict[str, str], str] | None:
+    """NAME;PARAM=V;...:VALUE -> (NAME, params, VALUE); respeta ':' dentro de comillas."""
+    quoted = False
+    for i, ch in enumerate(line):
+        if ch == '"':
+            quoted = not quoted
+        elif ch == ":" and not quoted:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        return None
+    name, *raw_params = head.split(";")
+    params: Dict[str, str] = {}
+    for rp in raw_params:
+        k, _, v = rp.partition("=")
+        params[k.upper()] = v.strip('"')
+    return name.upper(), params, value
+
+
+def _parse_ics_dt(value: str, params: Dict[str, str]) -> datetime | date:
+    m = _DT_RE.fullmatch(value.strip())
+    if m is None:
+        raise ValueError(f"bad ICS date-time: {value!r}")
+    y, mo, d, hh, mi, ss, z = m.groups()
+    if hh is None:
+        return date(int(y), int(mo), int(d))
+    if params.get("VALUE", "").upper() == "DATE":
+        raise ValueError(f"VALUE=DATE with a time: {value!r}")
+    if z:
+        tz: Any = timezone.utc
+    else:
+        tzid = params.get("TZID")
+        tz = _tz(tzid) if tzid else None
+    return datetime(int(y), int(mo), int(d), int(hh), int(mi), int(ss), tzinfo=tz)
+
 
+def _fast_ics_scan(text: str) -> List[_Event] | None:
+    """
+    Escaneo de una pasada que sólo extrae DTSTART/DTEND/DURATION de cada VEVENT.
+    Devuelve None si el archivo necesita el parser completo (recurrencias, TZID no IANA, valores raros).
+    """
+    lines: List[str] = []
+    for raw in text.splitlines():
+        if raw[:1] in (" ", "\t") and lines:
+            lines[-1] += raw[1:]  # unfolding RFC 5545
+        else:
+            lines.append(raw)
 
-def _expand_events_for_range(cal: _Calendar, rng_start: datetime, rng_end: datetime) -> List[Dict]:
-    events: List[Dict] = []
-    start_wide = rng_start - timedelta(days=1)
-    end_wide = rng_end + timedelta(days=1)
+    events: List[_Event] = []
+    depth = 0  # >0 dentro de un VEVENT; >1 dentro de sub-componentes (VALARM)
+    cur: Dict[str, Any] = {}
     try:
-        import recurring_ical_events  # type: ignore
-        comps = recurring_ical_events.of(cal).between(start_wide, end_wide)
-    except Exception:
-        comps = [c for c in cal.walk("VEVENT")]
+        for line in lines:
+            if not line:
+                continue
+            prop = _split_prop(line)
+            if prop is None:
+                continue
+            name, params, value = prop
+            if name == "BEGIN":
+                if depth or value.strip().upper() == "VEVENT":
+                    depth += 1
+                    if depth == 1:
+                        cur = {}
+                continue
+            if name == "END" and depth:
+                depth -= 1
+                if depth == 0:
+                    raw_start = cur.get("DTSTART")
+                    if raw_start is None:
+                        continue
+                    # mismo fin que recurring_ical_events: DTEND, o DTSTART + DURATION;
+                    # sin ninguno, un datetime dura 0 (luego +1 min) y una fecha el día completo
+                    raw_end = cur.get("DTEND")
+                    if raw_end is None:
+                        dur = cur.get("DURATION")
+                        if dur is not None:
+                            raw_end = raw_start + dur
+                        elif isinstance(raw_start, datetime):
+                            raw_end = raw_start
+                        else:
+                            raw_end = raw_start + timedelta(days=1)
+                    events.append((raw_start, raw_end))
+                continue
+            if depth != 1:
+                continue
+            if name in _RECUR_PROPS:
+                return None
+            if name in ("DTSTART", "DTEND"):
+                cur[name] = _parse_ics_dt(value, params)
+            elif name == "DURATION":
+                dur = _vDuration.from_ical(value.strip())
+                if not isinstance(dur, timedelta):
+                    return None
+                cur[name] = dur
+    except (ValueError, KeyError, ZoneInfoNotFoundError):
+        return None
+    return events
+
+
+@lru_cache(maxsize=8)
+def _fast_index_cached(path_str: str, mtime_ns: int, size: int) -> Dict[date, List[_Event]] | None:
+    text = Path(path_str).read_bytes().decode("utf-8", errors="replace")
+    events = _fast_ics_scan(text)
+    return _index_events(events) if events is not None else None
 
+
+def _fast_index(ics_path: str | Path) -> Dict[date, List[_Event]] | None:
+    p = Path(ics_path).resolve()
+    st = os.stat(p)
+    return _fast_index_cached(str(p), st.st_mtime_ns, st.st_size)
+
+
+def _events_from_components(comps) -> List[_Event]:
+    events: List[_Event] = []
     for comp in comps:
         dtstart_field = comp.get("DTSTART")
         if not dtstart_field:
@@ -69,20 +251,93 @@ def _expand_events_for_range(cal: _Calendar, rng_start: datetime, rng_end: datet
                 raw_end = datetime(raw_start.year, raw_start.month, raw_start.day, 1, 0)
         else:
             raw_end = dtend_field.dt
+        events.append((raw_start, raw_end))
+    return events
+
+
+# Índice fecha -> eventos por calendario. Por defecto cubre solo el rango pedido + un margen chico:
+# main() consulta un único día por proceso y expandir RRULEs sobre años cuesta ~10x más.
+# Quien consulte muchos días puede pedir la ventana amplia (window=_INDEX_WINDOW).
+_INDEX_MARGIN = timedelta(days=3)
+_INDEX_WINDOW = timedelta(days=366)
+_MAX_SPAN_DAYS = 400
+_DAY_INDEX: "OrderedDict[int, Tuple[_Calendar, date, date, Dict[date, List[_Event]]]]" = OrderedDict()
+_DAY_INDEX_MAX = 4
+
 
-        is_all_day = isinstance(raw_start, date) and not isinstance(raw_start, datetime)
-        events.append({"start": raw_start, "end": raw_end, "summary": str(comp.get("SUMMARY") or ""), "all_day": bool(is_all_day)})
+def _build_day_index(cal: _Calendar, lo: date, hi: date) -> Dict[date, List[_Event]]:
+    comps = None
+    if _RIE is not None:
+        try:
+            comps = _ruler(cal).between(lo, hi)
+        except Exception:
+            comps = None  # RRULE inválida: caemos al walk plano
+    if comps is None:
+        comps = [c for c in cal.walk("VEVENT")]
+
+    return _index_events(_events_from_components(comps))
 
-    out: List[Dict] = []
+
+def _index_events(events: List[_Event]) -> Dict[date, List[_Event]]:
+    index: Dict[date, List[_Event]] = defaultdict(list)
     for ev in events:
-        s, e = ev["start"], ev["end"]
+        start, end = ev
+        d0 = start.date() if isinstance(start, datetime) else start
+        d1 = end.date() if isinstance(end, datetime) else end
+        # eventos multi-día se registran en cada fecha que tocan
+        d1 = min(max(d0, d1), d0 + timedelta(days=_MAX_SPAN_DAYS))
+        d = d0
+        while d <= d1:
+            index[d].append(ev)
+            d += timedelta(days=1)
+    return dict(index)
+
+
+def _day_index(cal: _Calendar, first: date, last: date, window: timedelta = _INDEX_MARGIN) -> Dict[date, List[_Event]]:
+    hit = _DAY_INDEX.get(id(cal))
+    if hit is not None and hit[0] is cal:
+        if hit[1] <= first and last <= hit[2]:
+            _DAY_INDEX.move_to_end(id(cal))
+            return hit[3]
+        # fuera del rango cacheado: se ensancha (unión con lo ya cubierto) en vez de reemplazar
+        lo, hi = min(hit[1], first - window), max(hit[2], last + window)
+    else:
+        lo, hi = first - window, last + window
+    index = _build_day_index(cal, lo, hi)
+    _DAY_INDEX[id(cal)] = (cal, lo, hi, index)
+    _DAY_INDEX.move_to_end(id(cal))
+    while len(_DAY_INDEX) > _DAY_INDEX_MAX:
+        _DAY_INDEX.popitem(last=False)
+    return index
+
+
+def _expand_events_for_range(cal: _Calendar, rng_start: datetime, rng_end: datetime) -> List[_Event]:
+    first = (rng_start - timedelta(days=1)).date()
+    last = (rng_end + timedelta(days=1)).date()
+    return _events_in_range(_day_index(cal, first, last), rng_start, rng_end)
+
+
+def _events_in_range(index: Dict[date, List[_Event]], rng_start: datetime, rng_end: datetime) -> List[_Event]:
+    first = (rng_start - timedelta(days=1)).date()
+    last = (rng_end + timedelta(days=1)).date()
+    seen: set[int] = set()
+    events: List[_Event] = []
+    d = first
+    while d <= last:
+        for ev in index.get(d, ()):
+            if id(ev) not in seen:
+                seen.add(id(ev))
+                events.append(ev)
+        d += timedelta(days=1)
+
+    out: List[_Event] = []
+    for s, e in events:
         if isinstance(s, date) and not isinstance(s, datetime):
             s = datetime(s.year, s.month, s.day)
         if isinstance(e, date) and not isinstance(e, datetime):
             e = datetime(e.year, e.month, e.day)
         if s < rng_end and e > rng_start:
-            ev["start"], ev["end"] = s, e
-            out.append(ev)
+            out.append((s, e))
     return out
 
 
@@ -93,50 +348,55 @@ def get_free_blocks(
     day_start_hour: int = 8,
     day_end_hour: int = 21,
     tz_name: str = "America/Mexico_City",
+    fast_parse: bool = True,
 ) -> tuple[List[Dict], List[Dict]]:
     """
     Always returns something:
     - If ICS is present: compute real gaps.
     - If ICS missing: default free block 08:00–21:00 and one 'Deep work' suggestion.
+    `fast_parse=False` forces icalendar's parser (the scanner is only used for non-recurring calendars).
     """
-    tz = ZoneInfo(tz_name)
+    tz = _tz(tz_name)
     today = datetime.now(tz).date()
     win_start = datetime(today.year, today.month, today.day, day_start_hour, 0, tzinfo=tz)
     win_end = datetime(today.year, today.month, today.day, day_end_hour, 0, tzinfo=tz)
 
     # Try to load calendar; on failure, default to a single big free block
     try:
-        cal = _load_calendar(ics_path)
-        occurrences = _expand_events_for_range(cal, win_start, win_end)
-        busy: List[Tuple[datetime, datetime]] = []
-        for ev in occurrences:
-            start_local = _to_local_dt(ev["start"], tz, is_end=False)
-            end_local = _to_local_dt(ev["end"], tz, is_end=True)
-            if end_local <= start_local:
-                end_local = start_local + timedelta(minutes=1)
-            clipped = _clip_interval(start_local, end_local, win_start, win_end)
+        index = _fast_index(ics_path) if fast_parse else None
+        if index is not None:
+            occurrences = _events_in_range(index, win_start, win_end)
+        else:
+            occurrences = _expand_events_for_range(_load_calendar(ics_path), win_start, win_end)
+        # Todo en segundos "de reloj" (int): clip, merge y huecos sin aritmética de datetime
+        ws, we = _wall_ep(win_start), _wall_ep(win_end)
+        busy: List[Tuple[int, int]] = []
+        for start, end in occurrences:
+            s_ep = _wall_ep(_to_local_dt(start, tz, is_end=False))
+            e_ep = _wall_ep(_to_local_dt(end, tz, is_end=True))
+            if e_ep <= s_ep:
+                e_ep = s_ep + 60
+            clipped = _clip_interval(s_ep, e_ep, ws, we)
             if clipped:
                 busy.append(clipped)
-        busy = _merge_intervals(busy)
-
-        free: List[Tuple[datetime, datetime]] = []
-        cur = win_start
-        for s, e in busy:
-            if s > cur:
-                free.append((cur, s))
-            cur = max(cur, e)
-        if cur < win_end:
-            free.append((cur, win_end))
-
-        blocks: List[Dict] = []
-        for s, e in free:
-            mins = int((e - s).total_seconds() // 60)
-            if mins >= min_block:
-                blocks.append({"start": s.replace(tzinfo=None), "end": e.replace(tzinfo=None), "minutes": mins})
+
+        # sólo los bloques que pasan el filtro vuelven a datetime
+        starts = np.fromiter((s for s, _ in busy), dtype=np.int64, count=len(busy))
+        ends = np.fromiter((e for _, e in busy), dtype=np.int64, count=len(busy))
+        ms, me = _merge_intervals(starts, ends)
+        gap_s = np.concatenate(([ws], me))
+        gap_e = np.concatenate((ms, [we]))
+        mins_arr = (gap_e - gap_s) // 60
+        keep = (gap_e > gap_s) & (mins_arr >= min_block)
+
+        blocks: List[Dict] = [
+            {"start": _from_wall_ep(s), "end": _from_wall_ep(e), "minutes": int(m)}
+            for s, e, m in zip(gap_s[keep], gap_e[keep], mins_arr[keep])
+        ]
 
     except Exception:
         # Default free block if ICS missing/unreadable
-        mins = int((win_end - win_start).total_seconds() // 60)
+        mins = (_wall_ep(win_end) - _wall_ep(win_start)) // 60
         blocks = [{"start": win_start.replace(tzinfo=None), "end": win_end.replace(tzinfo=None), "minutes": mins}]
 
     suggestions: List[Dict] = []
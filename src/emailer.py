@@ -1,72 +1,166 @@
 from __future__ import annotations
-import os, ssl, smtplib, certifi, mimetypes, re
+import io, os, ssl, smtplib, binascii, certifi, mimetypes, mmap, re
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Tuple
+from email.generator import BytesGenerator
+from email.message import Message
 from email.utils import formatdate
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
-from email import encoders
+
+# un solo SSLContext por proceso (parsear el bundle de certifi no es gratis); es reutilizable entre conexiones
+_SSL_CTX = ssl.create_default_context(cafile=certifi.where())
 
 def _read(p: str) -> str:
-    return Path(p).read_text(encoding="utf-8")
+    with open(p, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # archivo vacío
+            return ""
+        with mm:
+            return str(mm, "utf-8")
 
-def _smtp_send(host, user, password, sender, to_list, msg, prefer_ssl=True, port_ssl=465, port_tls=587) -> str:
-    ctx = ssl.create_default_context(cafile=certifi.where())
+def _smtp_connect(host, user, password, prefer_ssl=True, port_ssl=465, port_tls=587) -> Tuple[smtplib.SMTP, str]:
+    """Devuelve (sesión ya autenticada, modo); SSL primero y STARTTLS como respaldo."""
     last_err = None
     if prefer_ssl:
+        s: smtplib.SMTP | None = None
         try:
-            with smtplib.SMTP_SSL(host, port_ssl, context=ctx, timeout=30) as s:
-                s.login(user, password)
-                s.sendmail(sender, to_list, msg.as_string())
-            return f"SSL:{port_ssl}"
+            s = smtplib.SMTP_SSL(host, port_ssl, context=_SSL_CTX, timeout=30)
+            s.login(user, password)
+            return s, f"SSL:{port_ssl}"
         except Exception as e:
             last_err = e
+            if s is not None:
+                s.close()
+    s = None
     try:
-        with smtplib.SMTP(host, port_tls, timeout=30) as s:
-            s.ehlo(); s.starttls(context=ctx); s.ehlo()
-            s.login(user, password)
-            s.sendmail(sender, to_list, msg.as_string())
-        return f"STARTTLS:{port_tls}"
+        s = smtplib.SMTP(host, port_tls, timeout=30)
+        s.ehlo(); s.starttls(context=_SSL_CTX); s.ehlo()
+        s.login(user, password)
+        return s, f"STARTTLS:{port_tls}"
     except Exception as e:
+        if s is not None:
+            s.close()
         if last_err:
             raise RuntimeError(f"SSL failed: {last_err}; STARTTLS failed: {e}")
         raise
 
-def _collect_images_from_html(html_path: str) -> List[Tuple[str, Path]]:
-    html = _read(html_path)
-    srcs = re.findall(r'<img\s+[^>]*src="([^"]+)"', html, flags=re.I)
-    out: List[Tuple[str, Path]] = []
-    for src in srcs:
-        p = Path(src)
-        if not p.is_absolute():
-            p = Path(html_path).parent / src
-        p = p.resolve()
-        if p.exists() and p.is_file():
-            out.append((src, p))
-    return out
-
-def _embed_cids(html: str, mapping: Dict[str, str]) -> str:
-    def repl(m):
-        src = m.group(1)
-        cid = mapping.get(src)
-        return f'src="cid:{cid}"' if cid else m.group(0)
-    return re.sub(r'src="([^"]+)"', repl, html, flags=re.I)
-
-def send_brief(cfg: Dict[str, Any], html_path: str, pages_url: str = "") -> None:
+@contextmanager
+def _smtp_session(host, user, password, prefer_ssl=True, port_ssl=465, port_tls=587) -> Iterator[Tuple[smtplib.SMTP, str]]:
+    s, mode = _smtp_connect(host, user, password, prefer_ssl, port_ssl, port_tls)
+    try:
+        yield s, mode
+    finally:
+        try:
+            s.quit()
+        except Exception:
+            s.close()
+
+_LEADING_DOT = re.compile(rb"(?m)^\.")
+
+def _send_on(s: smtplib.SMTP, msg: Message, sender: str, to_list: List[str]) -> None:
+    """
+    Envía `msg` sobre una sesión abierta. Si el servidor anuncia PIPELINING (RFC 2920),
+    MAIL/RCPT/DATA van en un solo write y se leen las respuestas después: un RTT en vez de 2+N.
+    """
+    s.ehlo_or_helo_if_needed()
+    if not s.has_extn("pipelining"):
+        s.send_message(msg, from_addr=sender, to_addrs=to_list)
+        return
+
+    buf = io.BytesIO()
+    BytesGenerator(buf).flatten(msg, linesep="\r\n")
+    data = _LEADING_DOT.sub(b"..", buf.getvalue())
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+
+    cmds = [f"MAIL FROM:{smtplib.quoteaddr(sender)}"] + [f"RCPT TO:{smtplib.quoteaddr(r)}" for r in to_list] + ["DATA"]
+    s.send("".join(c + "\r\n" for c in cmds))
+    replies = [s.getreply() for _ in cmds]
+
+    code, resp = replies[0]
+    if code != 250:
+        s.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, sender)
+    refused = {r: rep for r, rep in zip(to_list, replies[1:-1]) if rep[0] not in (250, 251)}
+    if len(refused) == len(to_list):
+        s.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, resp = replies[-1]
+    if code != 354:
+        s.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    s.send(data + b".\r\n")
+    code, resp = s.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+
+def _smtp_send(host, user, password, sender, to_list, msg, prefer_ssl=True, port_ssl=465, port_tls=587) -> str:
+    with _smtp_session(host, user, password, prefer_ssl, port_ssl, port_tls) as (s, mode):
+        _send_on(s, msg, sender, to_list)
+    return mode
+
+def _smtp_settings(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    em = cfg.get("email", {}) or {}
+    sender = str(em.get("from") or "").strip()
+    smtp = em.get("smtp", {}) or {}
+    return {
+        "host": str(smtp.get("host", "smtp.gmail.com")),
+        "user": str(smtp.get("user") or sender).strip(),
+        "password": str(smtp.get("password") or os.getenv("GMAIL_APP_PASSWORD", "")).strip(),
+        "prefer_ssl": bool(smtp.get("prefer_ssl", True)),
+        "port_ssl": int(smtp.get("port_ssl", 465)),
+        "port_tls": int(smtp.get("port", 587)),
+    }
+
+def _recipients(cfg: Dict[str, Any]) -> Tuple[str, List[str]]:
+    em = cfg.get("email", {}) or {}
+    sender = str(em.get("from") or "").strip()
+    return sender, [t.strip() for t in (em.get("to") or []) if t and t.strip()]
+
+def _encode_b64(part: MIMEBase, data: bytes | memoryview) -> None:
+    """Como encoders.encode_base64 pero en una sola llamada C, plegando a 76 columnas (RFC 2045)."""
+    enc = binascii.b2a_base64(data, newline=False)
+    part.set_payload(b"\n".join(enc[i:i + 76] for i in range(0, len(enc), 76)).decode("ascii"))
+    part["Content-Transfer-Encoding"] = "base64"
+
+_IMG_SRC = re.compile(r'(<img\b[^>]*?\bsrc=")([^"]+)(")', re.I)
+
+def _inline_images(html: str, base_dir: Path) -> Tuple[str, List[Tuple[str, Path]]]:
+    """Una sola pasada: reescribe cada <img src> local a cid: y devuelve [(cid, path)]."""
+    found: List[Tuple[str, Path]] = []
+    by_src: Dict[str, str] = {}
+
+    def repl(m: re.Match[str]) -> str:
+        src = m.group(2)
+        cid = by_src.get(src)
+        if cid is None:
+            p = Path(src)
+            if not p.is_absolute():
+                p = base_dir / src
+            p = p.resolve()
+            if not (p.exists() and p.is_file()):
+                return m.group(0)
+            cid = f"img{len(found) + 1}@brief"
+            by_src[src] = cid
+            found.append((cid, p))
+        return f"{m.group(1)}cid:{cid}{m.group(3)}"
+
+    return _IMG_SRC.sub(repl, html), found
+
+def send_brief(cfg: Dict[str, Any], html_path: str, pages_url: str = "", smtp: smtplib.SMTP | None = None) -> None:
+    """Envía el brief; si se pasa `smtp` (la sesión que abre send_all con _smtp_session) la reutiliza en vez de abrir otra."""
     em = cfg.get("email", {}) or {}
     if not em.get("enabled", False):
         print("[email] Disabled.")
         return
-    sender = str(em.get("from") or "").strip()
-    to_list = [t.strip() for t in (em.get("to") or []) if t and t.strip()]
-    smtp = em.get("smtp", {}) or {}
-    host = str(smtp.get("host", "smtp.gmail.com"))
-    user = str(smtp.get("user") or sender).strip()
-    password = str(smtp.get("password") or os.getenv("GMAIL_APP_PASSWORD", "")).strip()
-    prefer_ssl = bool(smtp.get("prefer_ssl", True))
-    port_ssl = int(smtp.get("port_ssl", 465))
-    port_tls = int(smtp.get("port", 587))
+    sender, to_list = _recipients(cfg)
+    st = _smtp_settings(cfg)
+    host, user, password = st["host"], st["user"], st["password"]
+    prefer_ssl, port_ssl, port_tls = st["prefer_ssl"], st["port_ssl"], st["port_tls"]
     if not sender or not to_list or not user or not password:
         print("[email] Missing from/to/user/password.")
         return
@@ -79,43 +173,61 @@ def send_brief(cfg: Dict[str, Any], html_path: str, pages_url: str = "") -> None
       </div>
     """ if pages_url else ""
 
-    mixed = MIMEMultipart("mixed")
-    mixed["Subject"] = "🌅 Morning Tech Brief"
-    mixed["From"] = sender
-    mixed["To"] = ", ".join(to_list)
-    mixed["Date"] = formatdate(localtime=True)
+    html_text, imgs = _inline_images(link_block + raw_html, Path(html_path).parent)
 
-    related = MIMEMultipart("related")
     alt = MIMEMultipart("alternative")
     alt.attach(MIMEText("Your Morning Tech Brief (inline charts).", "plain", "utf-8"))
-    alt.attach(MIMEText(link_block + raw_html, "html", "utf-8"))
-    related.attach(alt)
-    mixed.attach(related)
-
-    imgs = _collect_images_from_html(html_path)
-    cid_map: Dict[str, str] = {}
-    for idx, (src, path) in enumerate(imgs, start=1):
-        cid = f"img{idx}@brief"
-        cid_map[src] = cid
+    alt.attach(MIMEText(html_text, "html", "utf-8"))
+
+    # sin imágenes locales basta con un alternative plano; con imágenes: mixed → related → alternative
+    if imgs:
+        msg = MIMEMultipart("mixed")
+        related = MIMEMultipart("related")
+        related.attach(alt)
+        msg.attach(related)
+    else:
+        msg = alt
+    msg["Subject"] = "🌅 Morning Tech Brief"
+    msg["From"] = sender
+    msg["To"] = ", ".join(to_list)
+    msg["Date"] = formatdate(localtime=True)
+
+    for cid, path in imgs:
         ctype, _ = mimetypes.guess_type(str(path))
         maintype, subtype = (ctype.split("/", 1) if ctype else ("application", "octet-stream"))
+        part = MIMEBase(maintype, subtype)
         with path.open("rb") as f:
-            part = MIMEBase(maintype, subtype)
-            part.set_payload(f.read())
-        encoders.encode_base64(part)
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # archivo vacío: mmap no admite longitud 0
+                _encode_b64(part, f.read())
+            else:
+                # el page cache respalda los bytes; el payload final es el str base64
+                with mm, memoryview(mm) as mv:
+                    _encode_b64(part, mv)
         part.add_header("Content-ID", f"<{cid}>")
         part.add_header("Content-Disposition", "inline", filename=path.name)
         related.attach(part)
 
-    if cid_map:
-        # replace the last HTML part in alt
-        for i in range(len(alt._payload) - 1, -1, -1):
-            part = alt._payload[i]
-            if isinstance(part, MIMEText) and part.get_content_subtype() == "html":
-                html_text = part.get_payload(decode=True).decode(part.get_content_charset() or "utf-8", "ignore")
-                html_text = _embed_cids(html_text, cid_map)
-                alt._payload[i] = MIMEText(html_text, "html", "utf-8")
-                break
-
-    mode = _smtp_send(host, user, password, sender, to_list, mixed, prefer_ssl, port_ssl, port_tls)
+    if smtp is not None:
+        _send_on(smtp, msg, sender, to_list)
+        print("[email] Sent via shared session")
+        return
+    mode = _smtp_send(host, user, password, sender, to_list, msg, prefer_ssl, port_ssl, port_tls)
     print(f"[email] Sent via {mode}")
+
+def send_all(cfg: Dict[str, Any], html_path: str, pages_url: str = "") -> None:
+    """Envía todo lo de la corrida (hoy: el brief) sobre una única sesión SMTP."""
+    em = cfg.get("email", {}) or {}
+    if not em.get("enabled", False):
+        print("[email] Disabled.")
+        return
+    # validación completa antes de abrir la sesión: config incompleta no paga el handshake TLS + login
+    sender, to_list = _recipients(cfg)
+    st = _smtp_settings(cfg)
+    if not sender or not to_list or not st["user"] or not st["password"]:
+        print("[email] Missing from/to/user/password.")
+        return
+    with _smtp_session(st["host"], st["user"], st["password"], st["prefer_ssl"], st["port_ssl"], st["port_tls"]) as (s, mode):
+        print(f"[email] Session via {mode}")
+        send_brief(cfg, html_path, pages_url=pages_url, smtp=s)
@@ -0,0 +1,20 @@
+# src/http_session.py
+from __future__ import annotations
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _build_session() -> requests.Session:
+    """Session compartida (keep-alive + pool) para news, ICS y Ollama."""
+    s = requests.Session()
+    # Retry no reintenta POST por defecto: las llamadas al LLM no se duplican
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+SESSION = _build_session()
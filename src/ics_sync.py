@@ -1,15 +1,50 @@
 # src/ics_sync.py
 from __future__ import annotations
+import json, os
 from pathlib import Path
-from typing import List, Union
-import requests
+from typing import Dict, List, Union
+
+from src.http_session import SESSION as _SESSION
+
+def _meta_path(dest: Path) -> Path:
+    # sidecar con ETag/Last-Modified del último 200: el GET condicional sobrevive entre corridas
+    return dest.with_name(dest.name + ".meta.json")
+
+def _load_meta(dest: Path, url: str) -> Dict[str, str]:
+    try:
+        with _meta_path(dest).open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) and meta.get("url") == url else {}
 
 def download_ics(url: str, dest: Union[str, Path]) -> Path:
     dest = Path(dest)
     dest.parent.mkdir(parents=True, exist_ok=True)
-    r = requests.get(url, timeout=15)
-    r.raise_for_status()
-    dest.write_bytes(r.content)
+    headers: Dict[str, str] = {}
+    # validadores solo si el sidecar es de esta misma URL; si no, GET incondicional
+    meta = _load_meta(dest, url) if dest.exists() else {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    # stream=True: el cuerpo va a disco por chunks, sin tener el .ics entero en memoria
+    with _SESSION.get(url, timeout=15, headers=headers, stream=True) as r:
+        if r.status_code == 304:
+            dest.touch()
+            return dest
+        r.raise_for_status()
+        tmp = dest.with_name(dest.name + ".tmp")
+        with tmp.open("wb") as f:
+            for chunk in r.iter_content(65536):
+                f.write(chunk)
+        os.replace(tmp, dest)
+        meta = {"url": url, "etag": r.headers.get("ETag", ""), "last_modified": r.headers.get("Last-Modified", "")}
+    try:
+        with _meta_path(dest).open("w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except OSError:
+        pass
     return dest
 
 def sync_ics(urls: Union[str, List[str]], dest_path: Union[str, Path]) -> Path:
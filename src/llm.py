@@ -1,20 +1,143 @@
 from __future__ import annotations
-import json, os
+import hashlib, json, os, time
+from pathlib import Path
 from typing import Any, Dict, List
-import requests
 
-def _call_ollama(model: str, prompt: str, temperature: float, timeout: int = 20) -> str:
+from requests.exceptions import ReadTimeout
+from src.http_session import SESSION as _SESSION
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # orjson es opcional: sin él se usa json de la stdlib
+    orjson = None
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _loads(data: bytes | str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def _call_ollama(model: str, prompt: str, temperature: float, timeout: int = 20, num_predict: int = 200) -> str:
+    # con stream=True Ollama manda NDJSON: un objeto por línea con un trozo en "response"
+    # hasta "done": true; se acumulan los trozos en vez de esperar al cuerpo entero
+    # (lanza en error: _call_ollama_with_budget decide si reintentar o cortar)
+    base = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434").rstrip("/")
+    payload = {"model": model, "prompt": prompt, "options": {"temperature": temperature, "num_predict": num_predict}, "stream": True}
+    with _SESSION.post(
+        f"{base}/api/generate",
+        data=_dumps(payload),
+        headers={"Content-Type": "application/json"},
+        timeout=timeout,
+        stream=True,
+    ) as r:
+        r.raise_for_status()
+        parts: List[str] = []
+        for line in r.iter_lines():
+            if not line:
+                continue
+            obj = _loads(line)
+            parts.append(obj.get("response") or "")
+            if obj.get("done"):
+                break
+    return "".join(parts).strip()
+
+def warmup_ollama(model: str) -> None:
+    """Carga el modelo (prompt vacío) y lo deja residente 30 min: el primer summarize no paga el cold load."""
     try:
         base = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434").rstrip("/")
-        r = requests.post(
+        payload = {"model": model, "prompt": "", "keep_alive": "30m", "options": {"num_predict": 1}}
+        _SESSION.post(
             f"{base}/api/generate",
-            json={"model": model, "prompt": prompt, "options": {"temperature": temperature}, "stream": False},
-            timeout=timeout,
-        )
-        r.raise_for_status()
-        return (r.json().get("response") or "").strip()
+            data=_dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=60,
+        ).close()
     except Exception:
+        pass  # best effort: si Ollama no está, summarize_news cae al fallback/breaker
+
+# circuit breaker: tras un fallo definitivo no se vuelve a llamar a Ollama en este lapso
+_LLM_DISABLED_UNTIL = 0.0
+_LLM_COOLDOWN = 300.0
+
+def _call_ollama_with_budget(model: str, prompt: str, temperature: float, num_predict: int,
+                             short_timeout: float = 8, long_timeout: float = 20) -> str:
+    """
+    Primer intento con timeout corto; solo si vence leyendo (modelo frío cargando) se reintenta
+    una vez con el largo. Cualquier otro fallo, o el segundo, abre el breaker y devuelve "".
+    """
+    global _LLM_DISABLED_UNTIL
+    try:
+        return _call_ollama(model, prompt, temperature, timeout=short_timeout, num_predict=num_predict)
+    except ReadTimeout:
+        pass
+    except Exception as e:
+        print(f"[WARN] Ollama no disponible: {e}")
+        _LLM_DISABLED_UNTIL = time.time() + _LLM_COOLDOWN
         return ""
+    try:
+        return _call_ollama(model, prompt, temperature, timeout=long_timeout, num_predict=num_predict)
+    except Exception as e:
+        print(f"[WARN] Ollama falló tras reintento: {e}")
+        _LLM_DISABLED_UNTIL = time.time() + _LLM_COOLDOWN
+        return ""
+
+# presupuesto de tokens: la latencia de Ollama crece con el prompt y con num_predict;
+# la salida esperada (summary + macro + 2–3 picks) cabe en ~120–180 tokens
+TOP_N_ARTICLES = 5
+SNIPPET_CHARS = 160
+DEFAULT_MAX_TOKENS = 200
+
+_LLM_CACHE_DIR = Path(".cache/llm")
+_LLM_CACHE_MAX = 64  # archivos; se podan los de mtime más viejo
+
+def _cache_key(articles: List[Dict[str, Any]], model: str, temperature: float, num_predict: int) -> str:
+    ident = [(a.get("title", ""), a.get("url", "")) for a in articles] + [model, temperature, num_predict]
+    return hashlib.sha256(json.dumps(ident, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _cache_get(key: str) -> Dict[str, Any] | None:
+    p = _LLM_CACHE_DIR / f"{key}.json"
+    try:
+        with p.open("r", encoding="utf-8") as f:
+            out = json.load(f)
+    except Exception:
+        return None
+    try:
+        os.utime(p)  # LRU: un hit cuenta como uso reciente
+    except OSError:
+        pass
+    return out if isinstance(out, dict) else None
+
+def _cache_put(key: str, out: Dict[str, Any]) -> None:
+    try:
+        _LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _LLM_CACHE_DIR / f"{key}.json.tmp"
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(out, f, ensure_ascii=False)
+        os.replace(tmp, _LLM_CACHE_DIR / f"{key}.json")
+        files = sorted(_LLM_CACHE_DIR.glob("*.json"), key=lambda q: q.stat().st_mtime_ns)
+        for old in files[:-_LLM_CACHE_MAX]:
+            old.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+def _json_body(text: str) -> str:
+    """Recorta el objeto JSON de la respuesta (fences ```json o prosa alrededor) con find/rfind, sin regex."""
+    if text.startswith("{"):
+        return text
+    i = text.find("{")
+    j = text.rfind("}")
+    return text[i:j + 1] if 0 <= i < j else text
+
+def _pick_link(p: Dict[str, Any], top: List[Dict[str, Any]]) -> str:
+    try:
+        i = int(p["id"])
+    except (KeyError, TypeError, ValueError):
+        i = -1
+    if 0 <= i < len(top):
+        return str(top[i].get("url", ""))
+    return str(p.get("link", "")).strip()
 
 def _fallback_summary(articles: List[Dict[str, Any]]) -> Dict[str, Any]:
     # Simple, deterministic backup using the first 2 headlines
@@ -36,41 +159,57 @@ def summarize_news(articles: List[Dict[str, Any]], ai_cfg: Dict[str, Any]) -> Di
     if not ai_cfg.get("enabled", False):
         return _fallback_summary(articles)
 
+    top = articles[:int(ai_cfg.get("top_n", TOP_N_ARTICLES))]
+    snippet_chars = int(ai_cfg.get("snippet_chars", SNIPPET_CHARS))
+    num_predict = int(ai_cfg.get("max_tokens", DEFAULT_MAX_TOKENS))
+    model = str(ai_cfg.get("model", "qwen2.5:3b-instruct"))
+    temperature = float(ai_cfg.get("temperature", 0.15))
+    key = _cache_key(top, model, temperature, num_predict)
+    hit = _cache_get(key)
+    if hit is not None:
+        return hit
+    if time.time() < _LLM_DISABLED_UNTIL:
+        return _fallback_summary(articles)
+
+    # sin URLs en el prompt (las de Google News son largas y no aportan al resumen):
+    # el modelo cita cada pick por "id" y el link se recupera de `top`
     compact = []
-    for a in articles[:8]:
+    for i, a in enumerate(top):
         compact.append({
+            "id": i,
             "title": a.get("title", "")[:200],
-            "snippet": (a.get("snippet") or "")[:240],
-            "link": a.get("url", ""),
+            "snippet": (a.get("snippet") or "")[:snippet_chars],
             "source": a.get("source", ""),
         })
     prompt = (
         "You are a concise tech/finance editor. Given recent AI/fintech headlines (JSON below), "
         "write: 1) summary <=60 words; 2) Macro <=40 words; 3) 2–3 research picks as JSON array "
-        "(title, why, link). Return ONLY JSON with keys: summary, macro, picks.\nHEADLINES_JSON:\n"
-        + json.dumps(compact, ensure_ascii=False)
+        "(title, why, id). Return ONLY JSON with keys: summary, macro, picks.\nHEADLINES_JSON:\n"
+        + _dumps(compact).decode("utf-8")
     )
 
-    text = _call_ollama(
-        model=str(ai_cfg.get("model", "qwen2.5:3b-instruct")),
+    text = _call_ollama_with_budget(
+        model=model,
         prompt=prompt,
-        temperature=float(ai_cfg.get("temperature", 0.15)),
-        timeout=20,
+        temperature=temperature,
+        num_predict=num_predict,
+        short_timeout=float(ai_cfg.get("timeout_short_sec", 8)),
+        long_timeout=float(ai_cfg.get("timeout_sec", 20)),
     )
     if not text:
         return _fallback_summary(articles)
 
     try:
-        data = json.loads(text)
+        data = _loads(_json_body(text))
         picks = []
         for p in (data.get("picks") or [])[:3]:
             if isinstance(p, dict):
                 picks.append({
                     "title": str(p.get("title", "")).strip(),
                     "why": str(p.get("why", "")).strip(),
-                    "link": str(p.get("link", "")).strip(),
+                    "link": _pick_link(p, top),
                 })
-        return {
+        out = {
             "summary": str(data.get("summary", "")).strip(),
             "macro": str(data.get("macro", "")).strip(),
             "picks": picks,
@@ -78,3 +217,5 @@ def summarize_news(articles: List[Dict[str, Any]], ai_cfg: Dict[str, Any]) -> Di
     except Exception:
         # fallback if the model doesn't return JSON
         return _fallback_summary(articles)
+    _cache_put(key, out)  # solo respuestas válidas del modelo; el fallback no se cachea
+    return out
@@ -1,10 +1,11 @@
 # src/markets.py
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import yfinance as yf
-import matplotlib
-matplotlib.use("Agg")  # backend sin GUI
-import matplotlib.pyplot as plt
+
+from src._chart_render import render_chart
 
 def fetch_watchlist(tickers: list[str], charts_dir: str) -> pd.DataFrame:
     """
@@ -14,70 +15,98 @@ def fetch_watchlist(tickers: list[str], charts_dir: str) -> pd.DataFrame:
     """
     charts = Path(charts_dir)
     charts.mkdir(parents=True, exist_ok=True)
+    if not tickers:
+        return pd.DataFrame([])
 
-    rows: list[dict] = []
+    # una sola descarga en lote para todos los tickers (columnas: ticker -> OHLCV)
+    try:
+        data = yf.download(
+            tickers, period="6mo", interval="1d", group_by="ticker",
+            threads=True, progress=False, auto_adjust=True
+        )
+    except Exception as e:
+        print(f"[WARN] yfinance falló para {', '.join(tickers)}: {e}")
+        return pd.DataFrame([])
 
+    def _close(t: str) -> pd.Series | None:
+        # solo la columna Close del ticker: nada de copiar/filtrar todo el OHLCV por ticker
+        if data is None or data.empty:
+            return None
+        if isinstance(data.columns, pd.MultiIndex):
+            col = (t, "Close")
+            return data[col] if col in data.columns else None
+        return data["Close"] if "Close" in data.columns else None  # versiones viejas: un solo ticker
+
+    # cálculo (NumPy, barato) en este proceso; el orden de rows sigue el de tickers
+    rows: list[dict] = []
+    jobs: list[tuple] = []
     for t in tickers:
-        df: pd.DataFrame | None = None
-        try:
-            df = yf.download(
-                t, period="6mo", interval="1d",
-                progress=False, auto_adjust=True
-            )
-        except Exception as e:
-            print(f"[WARN] yfinance falló para {t}: {e}")
-            continue
-
-        # Pylance-friendly: valida que df es DataFrame y tiene columnas esperadas
-        if df is None or df.empty or "Close" not in df.columns:
-            print(f"[WARN] sin datos para {t}")
-            continue
-
-        # Serie de cierre limpia
-        close = df["Close"].dropna()
-        if len(close) < 2:
-            print(f"[WARN] muy pocos datos para {t}")
-            continue
-
-        # MAs simples
-        df = df.copy()
-        df["MA20"] = df["Close"].rolling(20).mean()
-        df["MA50"] = df["Close"].rolling(50).mean()
-
-        # Cierres como escalares (sin FutureWarning)
-        last_close = close.iloc[-1].item()   # -> float escalar
-        prev_close = close.iloc[-2].item()   # -> float escalar
-
-        pct_d = ((last_close / prev_close) - 1) * 100 if prev_close != 0 else 0.0
-        price = last_close
-
-        # Señal: cruce MA o movimiento >= 2%
-        ma20_last = df["MA20"].iloc[-1]
-        ma50_last = df["MA50"].iloc[-1]
-        if pd.notna(ma20_last) and pd.notna(ma50_last) and float(ma20_last) > float(ma50_last):
-            signal = "MA20>MA50 ✅"
-        elif abs(pct_d) >= 2.0:
-            signal = f"Movimiento {'↑' if pct_d > 0 else '↓'} {pct_d:.1f}%"
-        else:
-            signal = "Sin señal"
-
-        # Gráfico (últimas ~120 velas)
-        plot_df = df[["Close", "MA20", "MA50"]].tail(120)
-        ax = plot_df.plot(figsize=(6, 3))
-        ax.set_title(t)
-        ax.set_xlabel("")
-        ax.set_ylabel("Precio")
-        out_path = charts / f"{t}.png"
-        plt.tight_layout()
-        plt.savefig(out_path)
-        plt.close()
-
-        rows.append({
-            "ticker": t,
-            "price": round(float(price), 2),
-            "pct_d": round(float(pct_d), 2),
-            "signal": signal,
-            "chart": str(out_path)
-        })
+        res = _ticker_row(t, _close(t), charts)
+        if res:
+            rows.append(res[0])
+            jobs.append(res[1])
+
+    # PNGs en paralelo en threads: nada de fork mientras main() tiene otros pools/threads vivos
+    # (un hijo que hereda un lock tomado colgaría f.result()); spawn/forkserver re-importan main.py
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(8, len(jobs))) as ex:
+            for f in [ex.submit(render_chart, *job) for job in jobs]:
+                f.result()
 
     return pd.DataFrame(rows)
+
+
+_PLOT_N = 120
+
+
+def _sma(arr: np.ndarray, n: int) -> np.ndarray:
+    """Media móvil simple alineada a la derecha (NaN en las primeras n-1), como rolling(n).mean()."""
+    out = np.full(arr.size, np.nan)
+    if arr.size >= n:
+        c = np.cumsum(np.insert(arr, 0, 0.0))
+        out[n - 1:] = (c[n:] - c[:-n]) / n
+    return out
+
+
+def _ticker_row(t: str, close: pd.Series | None, charts: Path) -> tuple[dict, tuple] | None:
+    """Fila de la tabla + argumentos de render_chart para el PNG; None si no hay datos."""
+    # Serie de cierre limpia (el índice es la unión de fechas de todos los tickers: NaN fuera)
+    close = close.dropna() if close is not None else None
+    if close is None or close.empty:
+        print(f"[WARN] sin datos para {t}")
+        return None
+    if len(close) < 2:
+        print(f"[WARN] muy pocos datos para {t}")
+        return None
+
+    # Cierres como float64 contiguo: MAs y variación salen de aritmética NumPy directa
+    arr = close.to_numpy(dtype="float64")
+    last_close, prev_close = float(arr[-1]), float(arr[-2])
+
+    pct_d = ((last_close / prev_close) - 1) * 100 if prev_close != 0 else 0.0
+    price = last_close
+
+    # Señal: cruce MA o movimiento >= 2% (solo hace falta el último valor de cada MA)
+    ma20_last = arr[-20:].mean() if arr.size >= 20 else np.nan
+    ma50_last = arr[-50:].mean() if arr.size >= 50 else np.nan
+    if not np.isnan(ma20_last) and not np.isnan(ma50_last) and ma20_last > ma50_last:
+        signal = "MA20>MA50 ✅"
+    elif abs(pct_d) >= 2.0:
+        signal = f"Movimiento {'↑' if pct_d > 0 else '↓'} {pct_d:.1f}%"
+    else:
+        signal = "Sin señal"
+
+    # Gráfico (últimas ~120 velas); las MAs solo sobre esa ventana + las 49 velas previas que necesita MA50
+    win = arr[-(_PLOT_N + 49):]
+    x = close.index[-_PLOT_N:].to_numpy()
+    out_path = charts / f"{t}.png"
+    chart_job = (t, x, win[-_PLOT_N:], _sma(win, 20)[-_PLOT_N:], _sma(win, 50)[-_PLOT_N:], str(out_path))
+
+    row = {
+        "ticker": t,
+        "price": round(float(price), 2),
+        "pct_d": round(float(pct_d), 2),
+        "signal": signal,
+        "chart": str(out_path)
+    }
+    return row, chart_job
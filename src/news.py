@@ -3,72 +3,145 @@ from __future__ import annotations
 
 import html
 import re
-from datetime import datetime, timedelta
-from typing import Any, Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
 
-import requests
 from bs4 import BeautifulSoup
-from bs4.element import Tag
+from lxml import etree
+
+from src.http_session import SESSION as _SESSION
+
+
+_WS_RE = re.compile(r"\s+")
+# remove trailing site names duplicated in titles (common in Google RSS)
+_SITE_TAIL_RE = re.compile(
+    r"\s*[-–—]\s*(Reuters|Bloomberg|Forbes|Axios|The Verge|BBC|NYT|GeekWire|TechCrunch)\s*$",
+    re.I,
+)
+_READMORE_RE = re.compile(r"(Read more|Continue reading).*?$", re.I)
+_TAG_RE = re.compile(r"<[^>]+>")
 
 
 def _clean_text(s: str) -> str:
-    s = re.sub(r"\s+", " ", s or "").strip()
-    # remove trailing site names duplicated in titles (common in Google RSS)
-    s = re.sub(
-        r"\s*[-–—]\s*(Reuters|Bloomberg|Forbes|Axios|The Verge|BBC|NYT|GeekWire|TechCrunch)\s*$",
-        "",
-        s,
-        flags=re.I,
-    )
-    return s
+    s = _WS_RE.sub(" ", s or "").strip()
+    return _SITE_TAIL_RE.sub("", s)
 
 
 def _smart_snippet(desc: str) -> str:
     """Prefer RSS <description>; strip boilerplate and trim."""
     txt = _clean_text(desc or "")
-    txt = re.sub(r"(Read more|Continue reading).*?$", "", txt, flags=re.I)
+    txt = _READMORE_RE.sub("", txt)
     return (txt[:240] + "…") if len(txt) > 240 else txt
 
 
+# recover: tolera feeds mal formados como hacía BeautifulSoup; sin entidades externas ni red
+_XML_PARSER = etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+
+
 def build_google_news_url(query: str, lang: str = "en-US", region: str = "US") -> str:
     q = query.replace(" ", "+")
     return f"https://news.google.com/rss/search?q={q}&hl={lang}&gl={region}&ceid={region}:{lang}"
 
 
-def _node_text(tag: Any) -> str:
-    if tag is None:
-        return ""
+@lru_cache(maxsize=2048)
+def _parse_rfc822(val: str) -> datetime | None:
     try:
-        return tag.get_text(strip=True)  # type: ignore[attr-defined]
-    except Exception:
-        try:
-            return str(tag).strip()
-        except Exception:
-            return ""
+        dt = parsedate_to_datetime(val)
+    except (TypeError, ValueError):
+        return None
+    # siempre UTC naive, comparable con el cutoff (antes un offset "+0200" daba un datetime aware)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
 
 
 def _parse_pubdate(val: str) -> datetime:
-    for fmt in ("%a, %d %b %Y %H:%M:%S %Z", "%a, %d %b %Y %H:%M:%S %z"):
-        try:
-            return datetime.strptime(val, fmt)
-        except Exception:
-            pass
-    return datetime.utcnow()
+    return _parse_rfc822(val) or datetime.utcnow()
 
 
 def sanitize_snippet(raw: str, max_len: int = 220) -> str:
     if not raw:
         return ""
     unescaped = html.unescape(raw)
-    try:
-        _soup = BeautifulSoup(unescaped, "html.parser")
-        txt = _soup.get_text(" ", strip=True)
-    except Exception:
-        txt = unescaped
+    if "<script" in unescaped or "<style" in unescaped:
+        # casos raros: BeautifulSoup descarta el contenido de script/style
+        try:
+            txt = BeautifulSoup(unescaped, "html.parser").get_text(" ", strip=True)
+        except Exception:
+            txt = unescaped
+    else:
+        # descripciones de Google News: texto con algunos <a>/<font>/<br>; basta un regex
+        txt = _TAG_RE.sub(" ", unescaped)
+        if "&" in txt:
+            txt = html.unescape(txt)  # entidades dentro del HTML, como las decodificaba el parser
     clean = " ".join(txt.split())
     return clean[:max_len]
 
 
+# url -> (ts monotonic, ETag, Last-Modified, cuerpo); Google News RSS cambia despacio
+_FEED_CACHE: Dict[str, Tuple[float, str, str, bytes]] = {}
+_FEED_TTL = 600.0
+
+
+def _get_feed(url: str, kw: str) -> bytes | None:
+    """Cuerpo del feed: de caché si tiene < _FEED_TTL s; si no, GET condicional. None si falla."""
+    now = time.monotonic()
+    hit = _FEED_CACHE.get(url)
+    if hit is not None and now - hit[0] < _FEED_TTL:
+        return hit[3]
+    headers: Dict[str, str] = {}
+    if hit is not None:
+        if hit[1]:
+            headers["If-None-Match"] = hit[1]
+        if hit[2]:
+            headers["If-Modified-Since"] = hit[2]
+    try:
+        r = _SESSION.get(url, timeout=10, headers=headers)
+        if r.status_code == 304 and hit is not None:
+            _FEED_CACHE[url] = (now, hit[1], hit[2], hit[3])
+            return hit[3]
+        r.raise_for_status()
+    except Exception as e:
+        print(f"[WARN] Error al obtener noticias para '{kw}': {e}")
+        return None
+    _FEED_CACHE[url] = (now, r.headers.get("ETag", ""), r.headers.get("Last-Modified", ""), r.content)
+    return r.content
+
+
+# (link, title, source, description, pubDate) tal cual vienen del RSS, sin procesar
+_RawItem = Tuple[str, str, str, str, str]
+
+
+def _fetch_one(kw: str, lang: str, region: str) -> List[_RawItem]:
+    """Descarga el RSS de una keyword y extrae los campos crudos; [] si falla la petición."""
+    url = build_google_news_url(kw, lang, region)
+    body = _get_feed(url, kw)
+    if body is None:
+        return []
+
+    try:
+        root = etree.fromstring(body, _XML_PARSER)
+    except etree.XMLSyntaxError as e:
+        print(f"[WARN] RSS inválido para '{kw}': {e}")
+        return []
+    if root is None:
+        return []
+    return [
+        (
+            (node.findtext("link") or "").strip(),
+            (node.findtext("title") or "").strip(),
+            (node.findtext("source") or "").strip(),
+            (node.findtext("description") or "").strip(),
+            (node.findtext("pubDate") or "").strip(),
+        )
+        for node in root.iterfind(".//item")
+    ]
+
+
 def fetch_news(
     keywords: List[str],
     limit: int = 5,
@@ -80,30 +153,25 @@ def fetch_news(
     Downloads recent items from Google News RSS.
     Returns: [{title, url, source, published(datetime), snippet, keyword}]
     """
+    if not keywords:
+        return []
     cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
     results: List[Dict[str, Any]] = []
+    seen_urls: set[str] = set()
 
-    for kw in keywords:
-        url = build_google_news_url(kw, lang, region)
-        try:
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-        except Exception as e:
-            print(f"[WARN] Error al obtener noticias para '{kw}': {e}")
-            continue
-
-        soup = BeautifulSoup(r.text, "xml")  # needs lxml installed
-        for node in soup.find_all("item"):
-            if not isinstance(node, Tag):
+    # una petición por keyword, todas en paralelo sobre la Session compartida;
+    # map conserva el orden de keywords, así el dedup por URL es determinista
+    with ThreadPoolExecutor(max_workers=min(8, len(keywords))) as ex:
+        raw_by_kw = list(ex.map(lambda kw: _fetch_one(kw, lang, region), keywords))
+
+    for kw, raw_items in zip(keywords, raw_by_kw):
+        for link, title, source, desc_raw, pub_raw in raw_items:
+            # dedup al ingerir: la misma URL bajo otra keyword no se vuelve a parsear
+            if not link or link in seen_urls:
                 continue
+            seen_urls.add(link)
 
-            title = _node_text(node.find("title"))
-            link = _node_text(node.find("link"))
-            source = _node_text(node.find("source"))
-            desc_raw = _node_text(node.find("description"))
-            pub_raw = _node_text(node.find("pubDate"))
             pub_date = _parse_pubdate(pub_raw) if pub_raw else datetime.utcnow()
-
             if pub_date < cutoff:
                 continue
 
@@ -124,20 +192,9 @@ def fetch_news(
                 }
             )
 
-    # Sort newest first and de-duplicate by URL
+    # Sort newest first (URLs ya únicas)
     results.sort(key=lambda x: x["published"], reverse=True)
-    seen: set[str] = set()
-    deduped: List[Dict[str, Any]] = []
-    for r in results:
-        u = r.get("url", "")
-        if not u or u in seen:
-            continue
-        seen.add(u)
-        deduped.append(r)
-        if len(deduped) >= limit:
-            break
-
-    return deduped
+    return results[:limit]
 
 
 if __name__ == "__main__":
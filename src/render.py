@@ -1,10 +1,33 @@
 # src/render.py
 from __future__ import annotations
 
+import os
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+_BYTECODE_DIR = Path(".cache/jinja")
+# un Environment por carpeta de plantillas; su caché interna guarda los templates ya compilados
+_ENV_CACHE: Dict[str, Environment] = {}
+
+
+def _get_env(tpl_dir: str) -> Environment:
+    env = _ENV_CACHE.get(tpl_dir)
+    if env is None:
+        # bytecode compilado entre ejecuciones; Jinja lo invalida por checksum del template
+        _BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+        env = Environment(
+            loader=FileSystemLoader(tpl_dir),
+            bytecode_cache=FileSystemBytecodeCache(directory=str(_BYTECODE_DIR)),
+            autoescape=select_autoescape(["html", "xml"]),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False,  # sin stat() del template en cada get_template
+            cache_size=50,
+        )
+        _ENV_CACHE[tpl_dir] = env
+    return env
 
 
 def render_brief(context: Dict[str, Any], template_path: str, out_path: str) -> str:
@@ -12,16 +35,13 @@ def render_brief(context: Dict[str, Any], template_path: str, out_path: str) ->
     tpl_dir = str(Path(template_path).parent)
     tpl_name = Path(template_path).name
 
-    env = Environment(
-        loader=FileSystemLoader(tpl_dir),
-        autoescape=select_autoescape(["html", "xml"]),
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
-    template = env.get_template(tpl_name)
+    template = _get_env(tpl_dir).get_template(tpl_name)
 
     html = template.render(**context)
     out = Path(out_path)
     out.parent.mkdir(parents=True, exist_ok=True)
-    out.write_text(html, encoding="utf-8")
+    # escritura atómica: publish.sh nunca ve un HTML a medias
+    tmp = out.with_name(out.name + ".tmp")
+    tmp.write_text(html, encoding="utf-8")
+    os.replace(tmp, out)
     return str(out.resolve())